@@ -1,14 +1,25 @@
+import asyncio
 import os
+import shutil
 import time
 import secrets
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Optional
 
+import aiofiles
+
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    ORJSONResponse,
+    PlainTextResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from converters import (
     TMP_DIR,
@@ -22,6 +33,15 @@ from converters import (
 
 app = FastAPI(title="Any2Any Converter v1")
 
+# Routing tables built once at import: extension -> default category, and
+# category -> (valid sources, valid targets, converter). PDF is the one
+# ambiguous source (doc vs image), resolved by the requested target below.
+EXT_TO_CAT = {e: "image" for e in IMAGE_IN} | {e: "doc" for e in DOC_IN}
+ALLOWED = {
+    "image": (IMAGE_IN, IMAGE_OUT, convert_image),
+    "doc": (DOC_IN, DOC_OUT, convert_doc),
+}
+
 # CORS: safe for now; tighten later for specific domain
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +51,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress text responses (HTML pages, JSON) for clients that accept gzip.
+# /download is exempt: the artifacts (ZIP/PDF/DOCX/images) are already
+# compressed, and GZipMiddleware gzips streamed FileResponses regardless of
+# minimum_size — burning CPU for ~0% gain and dropping Content-Length,
+# which kills browser download progress.
+class _GZipExceptDownloads:
+    def __init__(self, app, **kwargs):
+        self.app = app
+        self.gzip = GZipMiddleware(app, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/download/"):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+
+app.add_middleware(_GZipExceptDownloads, minimum_size=1024, compresslevel=5)
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
@@ -38,7 +77,21 @@ templates = Jinja2Templates(directory="templates")
 MAX_SIZE_BYTES = int(os.getenv("MAX_SIZE_BYTES", 50 * 1024 * 1024))  # 50MB
 MAX_REQUESTS = int(os.getenv("MAX_REQUESTS_PER_10M", 30))
 WINDOW = 600  # 10 minutes window
-BUCKET = {}   # ip -> [timestamps]
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", os.cpu_count() or 2))
+# Conversions are CPU-bound (Pillow/tesseract hold the GIL); run them in a
+# bounded process pool and shed load once the queue backs up too far.
+EXECUTOR = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+QUEUE_LIMIT = MAX_WORKERS * 4
+_QUEUED = 0
+# And cap how many a single client can run in parallel (back-pressure).
+PER_IP_CONCURRENT = int(os.getenv("PER_IP_CONCURRENT", 2))
+PER_IP_WAIT = 30  # seconds to wait for a slot before giving up with 429
+# ip -> [semaphore, active]; active counts handlers from before their acquire
+# await until release, so eviction can't race one that hasn't acquired yet.
+PER_IP_SEM = {}
+# Rate-limit state sharded 16 ways so concurrent handlers touch smaller
+# dicts; each shard maps ip -> (prev_count, curr_count, window_start).
+BUCKETS = [{} for _ in range(16)]
 
 
 def _ip(request: Request) -> str:
@@ -46,54 +99,173 @@ def _ip(request: Request) -> str:
 
 
 def _rate_limit(ip: str):
-    now = time.time()
-    start = now - WINDOW
-    BUCKET.setdefault(ip, [])
-    BUCKET[ip] = [t for t in BUCKET[ip] if t >= start]
-    if len(BUCKET[ip]) >= MAX_REQUESTS:
+    # Sliding-window counter: two integer counts per IP, the previous
+    # window weighted by how much of it still overlaps the sliding window.
+    # Monotonic clock: NTP jumps must not open or slam the window.
+    bucket = BUCKETS[hash(ip) & 15]
+    now = time.monotonic()
+    prev, curr, start = bucket.get(ip, (0, 0, now))
+    elapsed = now - start
+    if elapsed >= WINDOW:
+        # Roll the window forward; anything older than one full window is gone.
+        prev, curr = (curr, 0) if elapsed < 2 * WINDOW else (0, 0)
+        start = now - (elapsed % WINDOW)
+        elapsed = now - start
+    estimate = prev * (1.0 - elapsed / WINDOW) + curr
+    if estimate >= MAX_REQUESTS:
+        bucket[ip] = (prev, curr, start)
         raise HTTPException(429, "Too many requests, please try again later.")
-    BUCKET[ip].append(now)
+    bucket[ip] = (prev, curr + 1, start)
+
+
+def _evict_stale_buckets(now: float):
+    for bucket in BUCKETS:
+        for ip in [ip for ip, (_, _, start) in bucket.items() if start < now - 2 * WINDOW]:
+            bucket.pop(ip, None)
+    for ip, rec in list(PER_IP_SEM.items()):
+        if rec[1] == 0:  # idle: no holders or waiters
+            PER_IP_SEM.pop(ip, None)
 
 
 def _secure_name(name: str) -> str:
-    return secrets.token_hex(16) + (Path(name).suffix or "")
+    # Keep only a sane suffix: a leading dot isn't an extension (.hidden),
+    # and anything with separators or control characters is attacker input,
+    # not a file type.
+    i = name.rfind(".")
+    suffix = name[i:] if i > 0 else ""
+    if "/" in suffix or "\\" in suffix or not suffix.isprintable():
+        suffix = ""
+    return secrets.token_urlsafe(12) + suffix
+
+
+# Index of tmp files we created ourselves (path -> creation time), so the
+# sweeper can expire them without a stat() per file. The full glob pass only
+# runs for leftovers we don't know about (e.g. after a restart).
+_KNOWN = {}
+# filename -> full path, so /download can resolve files living in TTL buckets.
+_FILES = {}
+# filename -> os.stat_result captured at write time, so /download can hand
+# FileResponse a precomputed stat instead of re-statting the file.
+_STATS = {}
+_LAST_SWEEP = 0.0
+# True whenever files may need cleaning: set on every file we create,
+# cleared after a real sweep. Starts dirty so restart leftovers get swept.
+_DIRTY = True
+SWEEP_THROTTLE = 60  # seconds between real sweeps
+BUCKET_SECONDS = 600  # uploads are grouped into one dir per 10 minutes
+
+
+def _remember(p: Path):
+    global _DIRTY
+    _DIRTY = True
+    _KNOWN[p] = time.monotonic()
+    _FILES[p.name] = p
+    try:
+        _STATS[p.name] = p.stat()
+    except OSError:
+        pass
+
+
+def _upload_bucket(now: float) -> Path:
+    bucket = TMP_DIR / str(int(now) // BUCKET_SECONDS)
+    bucket.mkdir(exist_ok=True)
+    return bucket
 
 
 def _sweep_tmp(ttl_seconds: int = 20 * 60):
-    now = time.time()
-    for f in TMP_DIR.glob("*"):
+    global _LAST_SWEEP, _DIRTY
+    if not _DIRTY:
+        return
+    mono = time.monotonic()
+    if mono - _LAST_SWEEP < SWEEP_THROTTLE:
+        return
+    _LAST_SWEEP = mono
+    _evict_stale_buckets(mono)
+    now = time.time()  # wall clock: mtimes and bucket dir names are epoch-based
+    # Expired upload buckets go in one rmtree each instead of per-file unlinks.
+    # scandir gives us cached DirEntry stats: one syscall per entry, not two.
+    expired_bucket = int(now) // BUCKET_SECONDS - (ttl_seconds // BUCKET_SECONDS)
+    with os.scandir(TMP_DIR) as it:
+        for de in it:
+            try:
+                if de.is_dir(follow_symlinks=False):
+                    if de.name.isdigit() and int(de.name) <= expired_bucket:
+                        shutil.rmtree(de.path, ignore_errors=True)
+                    continue
+                if TMP_DIR / de.name in _KNOWN:
+                    continue
+                if now - de.stat(follow_symlinks=False).st_mtime > ttl_seconds:
+                    os.unlink(de.path)
+            except OSError:
+                pass
+    for p, born in list(_KNOWN.items()):
+        if mono - born > ttl_seconds:
+            try:
+                p.unlink(missing_ok=True)
+            except OSError:
+                pass
+            _KNOWN.pop(p, None)
+    for name, p in list(_FILES.items()):
+        if not p.exists():
+            _FILES.pop(name, None)
+            _STATS.pop(name, None)
+    # Nothing left to expire? Skip sweeps entirely until a new file shows up.
+    _DIRTY = bool(_KNOWN)
+
+
+UPLOAD_CHUNK = 8 * 1024 * 1024  # large chunks amortize per-write overhead
+
+
+def _drop_cache(p: Path):
+    # The upload is read exactly once by the converter; tell the kernel to
+    # drop its pages afterwards so big files don't crowd the page cache.
+    try:
+        fd = os.open(p, os.O_RDONLY)
         try:
-            if now - f.stat().st_mtime > ttl_seconds:
-                f.unlink()
-        except Exception:
-            pass
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except (OSError, AttributeError):
+        pass
 
 
 async def _save_upload(f: UploadFile, limit: int) -> Path:
-    dest = TMP_DIR / _secure_name(f.filename or "file.bin")
+    dest = _upload_bucket(time.time()) / _secure_name(f.filename or "file.bin")
     size = 0
-    with dest.open("wb") as out:
+    async with aiofiles.open(dest, "wb") as out:
         while True:
-            chunk = await f.read(1024 * 1024)
+            chunk = await f.read(UPLOAD_CHUNK)
             if not chunk:
                 break
             size += len(chunk)
             if size > limit:
-                out.close()
+                await out.close()
                 dest.unlink(missing_ok=True)
                 raise HTTPException(
                     413, f"File too large (>{limit // (1024 * 1024)}MB)."
                 )
-            out.write(chunk)
+            await out.write(chunk)
     dest.chmod(0o600)
-    dest.touch()
+    _remember(dest)
     return dest
 
 
+# The templates take no context beyond `request`, so render them once at
+# startup and serve cached bytes instead of re-running Jinja per hit.
+_STATIC_HTML = {}
+_STATIC_CACHE_HEADERS = {"Cache-Control": "public, max-age=300"}
+
+
+@app.on_event("startup")
+async def _prerender_templates():
+    for name in ("index", "privacy", "cookies"):
+        _STATIC_HTML[name] = templates.get_template(f"{name}.html").render()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     _sweep_tmp()
-    return templates.TemplateResponse("index.html", {"request": request})
+    return HTMLResponse(_STATIC_HTML["index"], headers=_STATIC_CACHE_HEADERS)
 
 
 @app.head("/")
@@ -113,12 +285,12 @@ async def healthz_head():
 
 @app.get("/privacy", response_class=HTMLResponse)
 async def privacy(request: Request):
-    return templates.TemplateResponse("privacy.html", {"request": request})
+    return HTMLResponse(_STATIC_HTML["privacy"], headers=_STATIC_CACHE_HEADERS)
 
 
 @app.get("/cookies", response_class=HTMLResponse)
 async def cookies(request: Request):
-    return templates.TemplateResponse("cookies.html", {"request": request})
+    return HTMLResponse(_STATIC_HTML["cookies"], headers=_STATIC_CACHE_HEADERS)
 
 
 @app.post("/api/convert")
@@ -138,12 +310,15 @@ async def convert(
     - PDF -> DOCX
     """
     _sweep_tmp()
-    _rate_limit(_ip(request))
+    ip = _ip(request)
+    _rate_limit(ip)
 
     if not file.filename:
         raise HTTPException(400, "No file provided.")
 
-    ext = (Path(file.filename).suffix or "").lower().lstrip(".")
+    name = file.filename
+    i = name.rfind(".")
+    ext = name[i + 1:].lower() if i >= 0 else ""
     if not ext:
         raise HTTPException(400, "File must have an extension.")
 
@@ -153,60 +328,60 @@ async def convert(
 
     # Save upload
     src_path = await _save_upload(file, MAX_SIZE_BYTES)
+
+    rec = PER_IP_SEM.setdefault(ip, [asyncio.Semaphore(PER_IP_CONCURRENT), 0])
+    rec[1] += 1  # counted before the acquire await, so eviction sees us
+    sem = rec[0]
+    try:
+        await asyncio.wait_for(sem.acquire(), timeout=PER_IP_WAIT)
+    except asyncio.TimeoutError:
+        rec[1] -= 1
+        raise HTTPException(429, "Too many concurrent conversions, please try again later.")
+
     t0 = time.time()
 
     try:
-        # Auto-detect category if not provided
+        # Auto-detect category if not provided. PDF->DOCX routes through the
+        # doc converter; PDF->images through the image converter.
         if category is None:
-            if ext in IMAGE_IN or ext == "pdf":
-                # In v1 we treat PDF as doc for PDF->DOCX,
-                # but for PDF->images we call convert_image with category 'image'.
-                # We will decide routing based on target below.
-                # Start with heuristic:
-                if ext == "pdf":
-                    # If target is docx -> doc category; if jpg/png/webp -> image category
-                    if target == "docx":
-                        category = "doc"
-                    else:
-                        category = "image"
-                else:
-                    category = "image"
-            elif ext in DOC_IN:
-                category = "doc"
+            if ext == "pdf":
+                category = "doc" if target == "docx" else "image"
             else:
-                category = "doc"  # fallback
+                category = EXT_TO_CAT.get(ext, "doc")
 
-        # Route based on category and target
-        if category == "image":
-            # - image -> pdf/docx
-            # - pdf -> jpg/png/webp
-            if ext == "pdf":
-                if target not in {"jpg", "png", "webp"}:
-                    raise HTTPException(
-                        400,
-                        "For PDF source in image mode, target must be JPG, PNG, or WEBP.",
-                    )
-            elif ext not in IMAGE_IN:
-                raise HTTPException(400, f"Unsupported image source: {ext}")
-
-            out_path = convert_image(src_path, target)
-
-        elif category == "doc":
-            # Only PDF -> DOCX in v1
-            if ext not in DOC_IN:
-                raise HTTPException(400, f"Unsupported document source: {ext}")
-            if target not in DOC_OUT:
+        # Validate the (category, ext, target) combination
+        try:
+            ins, outs, fn = ALLOWED[category]
+        except KeyError:
+            raise HTTPException(400, "Unsupported category.")
+
+        if category == "image" and ext == "pdf":
+            # PDF routed through the image converter: pages -> images ZIP
+            if target not in {"jpg", "png", "webp"}:
                 raise HTTPException(
                     400,
-                    f"Unsupported document target: {target}. Only DOCX is supported in v1.",
+                    "For PDF source in image mode, target must be JPG, PNG, or WEBP.",
                 )
-            out_path = convert_doc(src_path, target)
-
         else:
-            raise HTTPException(400, "Unsupported category.")
+            if ext not in ins:
+                raise HTTPException(400, f"Unsupported {category} source: {ext}")
+            if target not in outs:
+                raise HTTPException(400, f"Unsupported {category} target: {target}")
+
+        global _QUEUED
+        if _QUEUED >= QUEUE_LIMIT:
+            raise HTTPException(503, "Server is busy, please try again shortly.")
+        _QUEUED += 1
+        try:
+            loop = asyncio.get_running_loop()
+            out_path = await loop.run_in_executor(EXECUTOR, fn, src_path, target)
+        finally:
+            _QUEUED -= 1
 
+        _drop_cache(src_path)
+        _remember(out_path)
         elapsed = round(time.time() - t0, 2)
-        return JSONResponse(
+        return ORJSONResponse(
             {
                 "download": f"/download/{out_path.name}",
                 "filename": out_path.name,
@@ -218,11 +393,18 @@ async def convert(
         raise
     except Exception as e:
         raise HTTPException(500, f"Conversion failed: {e}")
+    finally:
+        sem.release()
+        rec[1] -= 1
 
 
 @app.get("/download/{fname}")
 async def download(fname: str):
-    p = TMP_DIR / fname
-    if not p.exists():
-        raise HTTPException(404, "File not found or expired.")
-    return FileResponse(str(p), filename=fname)
+    p = _FILES.get(fname, TMP_DIR / fname)
+    st = _STATS.get(fname)
+    if st is None:
+        try:
+            st = p.stat()
+        except OSError:
+            raise HTTPException(404, "File not found or expired.")
+    return FileResponse(str(p), filename=fname, stat_result=st)
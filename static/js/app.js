@@ -14,11 +14,13 @@
   const resultBox = $("#result");
 
   // Supported formats for v1 (front-end view)
-  const IMAGE_IN = ["jpg", "jpeg", "png", "webp", "tiff", "bmp"];
-  const DOC_IN = ["pdf"];
+  const IMAGE_IN = new Set(["jpg", "jpeg", "png", "webp", "tiff", "bmp"]);
+  const DOC_IN = new Set(["pdf"]);
+
+  const EXT_RE = /\.[^.]+$/;
 
   function extOf(name) {
-    const m = /\.[^.]+$/.exec(name || "");
+    const m = EXT_RE.exec(name || "");
     return m ? m[0].slice(1).toLowerCase() : "";
   }
 
@@ -34,14 +36,14 @@
   }
 
   function guessCategory(ext) {
-    if (DOC_IN.includes(ext)) return "doc";
-    if (IMAGE_IN.includes(ext)) return "image";
+    if (DOC_IN.has(ext)) return "doc";
+    if (IMAGE_IN.has(ext)) return "image";
     return "doc";
   }
 
   // Suggested targets based on v1 feature set
   function suggestedTargets(ext) {
-    if (IMAGE_IN.includes(ext)) {
+    if (IMAGE_IN.has(ext)) {
       // image -> PDF or DOCX
       return ["pdf", "docx"];
     }
@@ -53,7 +55,7 @@
   }
 
   function allTargetsFor(ext) {
-    if (IMAGE_IN.includes(ext)) {
+    if (IMAGE_IN.has(ext)) {
       return ["pdf", "docx"];
     }
     if (ext === "pdf") {
@@ -71,9 +73,9 @@
   function setSuggestions(ext) {
     chipsWrap.innerHTML = "";
     const opts = allTargetsFor(ext);
-    targetSelect.innerHTML = opts
-      .map((o) => `<option value="${o}">${o.toUpperCase()}</option>`)
-      .join("");
+    const frag = document.createDocumentFragment();
+    opts.forEach((o) => frag.appendChild(new Option(o.toUpperCase(), o)));
+    targetSelect.replaceChildren(frag);
 
     const top = suggestedTargets(ext).filter((x) => opts.includes(x));
     top.forEach((fmt) => {
@@ -172,7 +174,107 @@
   }
 
   // ---------- Convert click ----------
-  convertBtn.addEventListener("click", () => {
+
+  // Streamed request bodies need fetch + ReadableStream upload support
+  // (Chromium over HTTP/2); everywhere else we fall back to a plain
+  // FormData fetch with an indeterminate bar.
+  const supportsStreamUpload = (() => {
+    if (!window.ReadableStream) return false;
+    let duplexRead = false;
+    try {
+      new Request("/", {
+        method: "POST",
+        body: new ReadableStream(),
+        get duplex() {
+          duplexRead = true;
+          return "half";
+        },
+      });
+    } catch {
+      return false;
+    }
+    return duplexRead;
+  })();
+
+  function showProcessing() {
+    bar.style.width = "100%";
+    statusLine.textContent = "Processing…";
+    barInd.style.display = "block";
+    barInd.classList.add("indeterminate");
+  }
+
+  // Build the multipart body by hand so the file streams from disk through
+  // a byte-counting TransformStream instead of being buffered in memory.
+  function streamedUpload(file, target, cat) {
+    const boundary = "----any2any" + Math.random().toString(16).slice(2);
+    const enc = new TextEncoder();
+    const field = (name, value) =>
+      `--${boundary}\r\nContent-Disposition: form-data; name="${name}"\r\n\r\n${value}\r\n`;
+    const head = enc.encode(
+      field("target", target) +
+        field("category", cat) +
+        `--${boundary}\r\nContent-Disposition: form-data; name="file"; filename="${file.name.replace(
+          /"/g,
+          ""
+        )}"\r\nContent-Type: ${
+          file.type || "application/octet-stream"
+        }\r\n\r\n`
+    );
+    const tail = enc.encode(`\r\n--${boundary}--\r\n`);
+    const total = head.length + file.size + tail.length;
+    let sent = 0;
+
+    const counter = new TransformStream({
+      transform(chunk, ctrl) {
+        sent += chunk.byteLength;
+        bar.style.width = Math.round((sent / total) * 100) + "%";
+        if (sent >= total) showProcessing();
+        ctrl.enqueue(chunk);
+      },
+    });
+
+    const reader = file.stream().getReader();
+    const body = new ReadableStream({
+      start(ctrl) {
+        ctrl.enqueue(head);
+      },
+      // One chunk per pull: fetch only pulls when its internal queue has
+      // room, so backpressure bounds memory even when disk outpaces the
+      // network.
+      async pull(ctrl) {
+        const { done, value } = await reader.read();
+        if (done) {
+          ctrl.enqueue(tail);
+          ctrl.close();
+          return;
+        }
+        ctrl.enqueue(value);
+      },
+      cancel(reason) {
+        return reader.cancel(reason);
+      },
+    });
+
+    return fetch("/api/convert", {
+      method: "POST",
+      headers: {
+        "Content-Type": `multipart/form-data; boundary=${boundary}`,
+      },
+      body: body.pipeThrough(counter),
+      duplex: "half",
+    });
+  }
+
+  function formUpload(file, target, cat) {
+    const fd = new FormData();
+    fd.append("file", file);
+    fd.append("target", target);
+    fd.append("category", cat);
+    showProcessing();
+    return fetch("/api/convert", { method: "POST", body: fd });
+  }
+
+  convertBtn.addEventListener("click", async () => {
     if (convertBtn.disabled) {
       console.log("Convert clicked but disabled");
       return;
@@ -195,80 +297,65 @@
     console.log("Starting convert:", { srcExt, target, cat });
 
     statusLine.textContent = "Uploading…";
-    const fd = new FormData();
-    fd.append("file", file);
-    fd.append("target", target);
-    fd.append("category", cat);
 
-    const xhr = new XMLHttpRequest();
-    xhr.open("POST", "/api/convert");
-
-    xhr.onerror = () => {
+    let res;
+    try {
+      if (supportsStreamUpload) {
+        try {
+          res = await streamedUpload(file, target, cat);
+        } catch (e) {
+          // The probe only proves API support; Chromium still rejects
+          // ReadableStream bodies over HTTP/1.1 (ERR_H2_OR_QUIC_REQUIRED),
+          // e.g. when uvicorn is serving directly. Retry the plain
+          // FormData path before calling it a network error.
+          console.warn("Streamed upload failed, retrying with FormData", e);
+          bar.style.width = "0%";
+          res = await formUpload(file, target, cat);
+        }
+      } else {
+        res = await formUpload(file, target, cat);
+      }
+    } catch (e) {
+      console.error("Network error while uploading", e);
       barInd.classList.remove("indeterminate");
       barInd.style.display = "none";
       resultBox.innerHTML =
         '<span class="pill err">Error</span> Network error while uploading.';
       statusLine.textContent = "";
-    };
-    xhr.onabort = () => {
-      barInd.classList.remove("indeterminate");
-      barInd.style.display = "none";
-      resultBox.innerHTML =
-        '<span class="pill err">Cancelled</span> Upload was aborted.';
-      statusLine.textContent = "";
-    };
+      return;
+    }
 
-    xhr.upload.onprogress = (ev) => {
-      if (ev.lengthComputable) {
-        const pct = Math.round((ev.loaded / ev.total) * 100);
-        bar.style.width = pct + "%";
-      }
-    };
-    xhr.upload.onload = () => {
-      bar.style.width = "100%";
-      statusLine.textContent = "Processing…";
-      barInd.style.display = "block";
-      barInd.classList.add("indeterminate");
-    };
-
-    xhr.onreadystatechange = () => {
-      if (xhr.readyState === XMLHttpRequest.DONE) {
-        barInd.classList.remove("indeterminate");
-        barInd.style.display = "none";
-
-        if (xhr.status === 200) {
-          try {
-            const data = JSON.parse(xhr.responseText);
-            const t = data.process_time
-              ? ` <span class="muted">(⏱ ${data.process_time}s)</span>`
-              : "";
-            statusLine.textContent = "Done.";
-            resultBox.innerHTML = `<span class="pill ok">Done</span> <a class="link" href="${
-              data.download
-            }" download>Download ${escapeHtml(
-              data.filename
-            )}</a>${t}`;
-          } catch (e) {
-            console.error("Failed to parse JSON response", e, xhr.responseText);
-            statusLine.textContent = "Done.";
-            resultBox.textContent = "Download ready.";
-          }
-        } else {
-          let msg = xhr.responseText || `HTTP ${xhr.status}`;
-          try {
-            const data = JSON.parse(xhr.responseText);
-            msg = data.detail || msg;
-          } catch {}
-          console.error("Server error:", xhr.status, msg);
-          resultBox.innerHTML = `<span class="pill err">Error</span> ${escapeHtml(
-            msg
-          )}`;
-          statusLine.textContent = "";
-        }
-      }
-    };
+    barInd.classList.remove("indeterminate");
+    barInd.style.display = "none";
 
-    xhr.send(fd);
+    const text = await res.text();
+    if (res.ok) {
+      try {
+        const data = JSON.parse(text);
+        const t = data.process_time
+          ? ` <span class="muted">(⏱ ${data.process_time}s)</span>`
+          : "";
+        statusLine.textContent = "Done.";
+        resultBox.innerHTML = `<span class="pill ok">Done</span> <a class="link" href="${
+          data.download
+        }" download>Download ${escapeHtml(data.filename)}</a>${t}`;
+      } catch (e) {
+        console.error("Failed to parse JSON response", e, text);
+        statusLine.textContent = "Done.";
+        resultBox.textContent = "Download ready.";
+      }
+    } else {
+      let msg = text || `HTTP ${res.status}`;
+      try {
+        const data = JSON.parse(text);
+        msg = data.detail || msg;
+      } catch {}
+      console.error("Server error:", res.status, msg);
+      resultBox.innerHTML = `<span class="pill err">Error</span> ${escapeHtml(
+        msg
+      )}`;
+      statusLine.textContent = "";
+    }
   });
 
   // ---------- Cookie banner ----------